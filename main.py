@@ -1,25 +1,34 @@
+import asyncio
+import heapq
+import hmac
+import json
 import os
 import re
+import threading
 import urllib.parse
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from difflib import SequenceMatcher
+from functools import lru_cache
 from datetime import datetime, date, timedelta
 
 # third-party
 import mysql.connector
+from cachetools import TTLCache
+from mysql.connector import errorcode, pooling
 from fastmcp import FastMCP
 
 # For authentication and responses
 from starlette.requests import Request
-from starlette.responses import PlainTextResponse, JSONResponse
+from starlette.responses import PlainTextResponse, JSONResponse, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware import Middleware
 
-# Optional Levenshtein import
+# Optional rapidfuzz import
 try:
-    import Levenshtein
+    from rapidfuzz import fuzz, process
 except Exception:
-    Levenshtein = None
+    fuzz = None
+    process = None
 
 # -------------------------------
 # Configuration
@@ -30,6 +39,8 @@ DB_USER = os.environ.get("DB_USER", "tt_crm_mcp")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "F*PAtqhu@sg2w58n")
 DB_NAME = os.environ.get("DB_NAME", "tt_crm_mcp")
 DB_PORT = int(os.environ.get("DB_PORT", "3306"))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "20"))
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "10"))
 
 # Allow Smithery scanner without API key
 ALLOW_SCANNER_WITHOUT_AUTH = os.environ.get("ALLOW_SCANNER_WITHOUT_AUTH", "false").lower() == "true"
@@ -37,25 +48,30 @@ ALLOW_SCANNER_WITHOUT_AUTH = os.environ.get("ALLOW_SCANNER_WITHOUT_AUTH", "false
 # -------------------------------
 # API Key Authentication Middleware
 # -------------------------------
+# Encoded once at import; the middleware only encodes the incoming header per request
+_REQUIRED_API_KEY_ENCODED = REQUIRED_API_KEY.encode()
+_AUTH_SKIP_PATHS = frozenset({"/health", "/", "/.well-known/mcp-config"})
+
+def is_valid_api_key(api_key: str) -> bool:
+    # Constant-time compare so response timing doesn't reveal how much of the key matched
+    return hmac.compare_digest(api_key.encode(), _REQUIRED_API_KEY_ENCODED)
+
 class APIKeyMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         # Skip auth for health check and root
-        if request.url.path in ["/health", "/", "/.well-known/mcp-config"]:
+        if request.url.path in _AUTH_SKIP_PATHS:
             return await call_next(request)
         
-        # Special handling for Smithery scanner
-        user_agent = request.headers.get("user-agent", "").lower()
-        is_smithery_scanner = "smithery" in user_agent
-        
-        if ALLOW_SCANNER_WITHOUT_AUTH and is_smithery_scanner:
+        # Special handling for Smithery scanner; the user-agent is only read when the bypass is enabled
+        if ALLOW_SCANNER_WITHOUT_AUTH and "smithery" in request.headers.get("user-agent", "").lower():
             print("Allowing Smithery scanner without authentication for tool discovery")
             return await call_next(request)
         
-        # Check for API key in headers
+        # Check for API key in headers (authorization is only looked up when x-api-key is absent)
         api_key = request.headers.get("x-api-key") or request.headers.get("authorization")
         
         # If Authorization header, extract the key (handle "Bearer <key>" or just the key)
-        if api_key and api_key.startswith("Bearer "):
+        if api_key and api_key[:7] == "Bearer ":
             api_key = api_key[7:]
         
         if not api_key:
@@ -64,7 +80,7 @@ class APIKeyMiddleware(BaseHTTPMiddleware):
                 content={"error": "API key required. Use x-api-key header or Authorization: Bearer <key>"}
             )
         
-        if api_key != REQUIRED_API_KEY:
+        if not is_valid_api_key(api_key):
             return JSONResponse(
                 status_code=403,
                 content={"error": "Invalid API key"}
@@ -83,47 +99,66 @@ mcp = FastMCP(
 # -------------------------------
 # MySQL connection
 # -------------------------------
+DB_CONNECT_ARGS = {
+    "host": DB_HOST,
+    "user": DB_USER,
+    "password": DB_PASSWORD,
+    "database": DB_NAME,
+    "port": DB_PORT,
+    "autocommit": True,
+    "connection_timeout": DB_CONNECT_TIMEOUT,
+}
+
+_POOL: Optional[pooling.MySQLConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool() -> pooling.MySQLConnectionPool:
+    # Built lazily so importing the module does not require a reachable database
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = pooling.MySQLConnectionPool(
+                    pool_name="mcp",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=False,
+                    **DB_CONNECT_ARGS,
+                )
+    return _POOL
+
 def get_connection():
-    return mysql.connector.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME,
-        port=DB_PORT,
-        autocommit=True,
-    )
+    # close() on a pooled connection hands it back to the pool
+    try:
+        return get_pool().get_connection()
+    except mysql.connector.errors.PoolError:
+        # Pool exhausted by a burst: serve it with a one-off connection rather than failing the tool call
+        return mysql.connector.connect(**DB_CONNECT_ARGS)
 
 # -------------------------------
 # Name Matching Utilities
 # -------------------------------
-class NameMatcher:
-    @staticmethod
-    def normalize_name(name: str) -> str:
-        name = (name or "").lower().strip()
-        name = re.sub(r'[^\w\s]', '', name)
-        name = re.sub(r'\s+', ' ', name)
-        return name
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_WS_RE = re.compile(r'\s+')
 
-    @staticmethod
-    def similarity_score(name1: str, name2: str) -> float:
-        name1_norm = NameMatcher.normalize_name(name1)
-        name2_norm = NameMatcher.normalize_name(name2)
-
-        if Levenshtein:
-            try:
-                dist = Levenshtein.distance(name1_norm, name2_norm)
-                levenshtein_sim = 1 - (dist / max(len(name1_norm), len(name2_norm), 1))
-            except Exception:
-                levenshtein_sim = SequenceMatcher(None, name1_norm, name2_norm).ratio()
-        else:
-            levenshtein_sim = SequenceMatcher(None, name1_norm, name2_norm).ratio()
+@lru_cache(maxsize=8192)
+def normalize_name(name: str) -> str:
+    return _WS_RE.sub(' ', _PUNCT_RE.sub('', (name or "").lower().strip()))
 
-        sequence_sim = SequenceMatcher(None, name1_norm, name2_norm).ratio()
-        combined_score = (levenshtein_sim * 0.6) + (sequence_sim * 0.4)
-        return combined_score
+class NameMatcher:
+    @staticmethod
+    def normalized_similarity(name1_norm: str, name2_norm: str, score_cutoff: float = 0.0) -> float:
+        """SequenceMatcher fallback used only without rapidfuzz: similarity in [0, 1] of two
+        normalize_name outputs, or 0.0 as soon as it provably falls below score_cutoff."""
+        matcher = SequenceMatcher(None, name1_norm, name2_norm)
+        # real_quick_ratio/quick_ratio are cheap upper bounds on ratio()
+        if matcher.real_quick_ratio() < score_cutoff or matcher.quick_ratio() < score_cutoff:
+            return 0.0
+        return matcher.ratio()
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def extract_name_parts(full_name: str) -> Dict[str, str]:
+        # Cached: callers must treat the returned dict as read-only
         parts = (full_name or "").split()
         if len(parts) == 0:
             return {'first': '', 'last': ''}
@@ -135,24 +170,55 @@ class NameMatcher:
             return {'first': parts[0], 'last': parts[-1]}
 
     @staticmethod
-    def fuzzy_match_employee(search_name: str, employees: List[Dict[str, Any]], threshold: float = 0.6) -> List[Dict[str, Any]]:
+    def index_names(employees: List[Dict[str, Any]]) -> List[Tuple[str, str, str]]:
+        """(normalized name, first, last) per employee, so long-lived rosters are preprocessed once."""
+        name_index = []
+        for emp in employees:
+            name_norm = normalize_name(emp.get('developer_name') or '')
+            tokens = name_norm.split()
+            name_index.append((name_norm, tokens[0] if tokens else '', ' '.join(tokens[1:])))
+        return name_index
+
+    @staticmethod
+    def fuzzy_match_employee(search_name: str, employees: List[Dict[str, Any]], threshold: float = 0.6,
+                             limit: Optional[int] = None,
+                             name_index: Optional[List[Tuple[str, str, str]]] = None) -> List[Dict[str, Any]]:
+        if name_index is None:
+            name_index = NameMatcher.index_names(employees)
+
+        if process:
+            # token_sort_ratio covers "last first" order in one C-level call; unlike WRatio it
+            # has no partial-match boost, so "rahul" does not score 0.9 against "rahul verma".
+            choices = [name_norm for name_norm, _, _ in name_index]
+            results = process.extract(
+                normalize_name(search_name),
+                choices,
+                scorer=fuzz.token_sort_ratio,
+                processor=None,
+                limit=limit or len(choices),
+                score_cutoff=threshold * 100,
+            )
+            return [
+                {'employee': employees[idx], 'score': score / 100.0, 'match_type': 'fuzzy'}
+                for _, score, idx in results
+            ]
+
         matches = []
-        search_parts = NameMatcher.extract_name_parts(search_name)
+        # Normalize the query once; employee names come pre-normalized from name_index
+        search_norm = normalize_name(search_name)
+        search_parts = NameMatcher.extract_name_parts(search_norm)
 
-        for emp in employees:
+        for emp, (emp_norm, first_name, last_name) in zip(employees, name_index):
             scores = []
-            emp_full_name = f"{emp.get('developer_name','')}".strip()
-            scores.append(NameMatcher.similarity_score(search_name, emp_full_name))
+            scores.append(NameMatcher.normalized_similarity(search_norm, emp_norm, threshold))
 
-            if ' ' in emp_full_name:
-                first_name = emp_full_name.split()[0]
-                last_name = ' '.join(emp_full_name.split()[1:])
-                scores.append(NameMatcher.similarity_score(search_name, f"{first_name} {last_name}"))
-                scores.append(NameMatcher.similarity_score(search_name, f"{last_name} {first_name}"))
+            if last_name:
+                # "first last" is emp_norm itself once normalized, so only the swapped order adds a score
+                scores.append(NameMatcher.normalized_similarity(search_norm, f"{last_name} {first_name}", threshold))
 
             if search_parts['last']:
-                first_score = NameMatcher.similarity_score(search_parts['first'], emp_full_name.split()[0] if emp_full_name else '')
-                last_score = NameMatcher.similarity_score(search_parts['last'], ' '.join(emp_full_name.split()[1:]) if ' ' in emp_full_name else '')
+                first_score = NameMatcher.normalized_similarity(search_parts['first'], first_name)
+                last_score = NameMatcher.normalized_similarity(search_parts['last'], last_name)
                 if first_score > 0 or last_score > 0:
                     scores.append((first_score + last_score) / 2)
 
@@ -160,53 +226,117 @@ class NameMatcher:
             if best_score >= threshold:
                 matches.append({'employee': emp, 'score': best_score, 'match_type': 'fuzzy'})
 
+        if limit:
+            return heapq.nlargest(limit, matches, key=lambda x: x['score'])
         matches.sort(key=lambda x: x['score'], reverse=True)
         return matches
 
 # -------------------------------
 # Database Functions
 # -------------------------------
-def fetch_employees_ai(search_term: str = None, emp_id: int = None) -> List[Dict[str, Any]]:
+# Enough to list, disambiguate and fuzzy-match employees; fetch_employee_full reads the rest
+EMPLOYEE_BRIEF_COLUMNS = "d.id, d.developer_name, d.designation, d.email_id, d.mobile, d.emp_number, d.status"
+
+# Cleared the first time MySQL reports the ngram FULLTEXT index ft_all is missing
+_SEARCH_FULLTEXT_AVAILABLE = True
+
+# Boolean-mode operators are stripped so user input is always searched as a plain phrase
+_FT_OPERATORS_RE = re.compile(r'[+\-<>()~*"@]')
+NGRAM_TOKEN_SIZE = 2
+
+def search_employees_fulltext(cursor, search_term: str) -> List[Dict[str, Any]]:
+    """Indexed search over name, email and employee number, plus a mobile prefix match; [] tells the caller to fall back to LIKE.
+
+    The index only narrows the candidates: each MATCH hit must also satisfy the original
+    LIKE predicate, so ngrams dropped as stopwords can't widen the phrase into false positives.
+    The mobile lookup is a separate UNION leg, since a MATCH inside an OR can't use the index.
+    """
+    global _SEARCH_FULLTEXT_AVAILABLE
+    phrase = _WS_RE.sub(' ', _FT_OPERATORS_RE.sub(' ', search_term)).strip()
+    if not _SEARCH_FULLTEXT_AVAILABLE or len(phrase) < NGRAM_TOKEN_SIZE:
+        return []
+
+    phrase = f'"{phrase}"'
+    try:
+        cursor.execute(f"""
+            (SELECT {EMPLOYEE_BRIEF_COLUMNS},
+                    MATCH(d.developer_name, d.email_id, d.emp_number) AGAINST (%s IN BOOLEAN MODE) AS relevance
+             FROM developer d
+             WHERE MATCH(d.developer_name, d.email_id, d.emp_number) AGAINST (%s IN BOOLEAN MODE)
+               AND (d.developer_name LIKE %s OR d.email_id LIKE %s OR d.emp_number LIKE %s))
+            UNION ALL
+            (SELECT {EMPLOYEE_BRIEF_COLUMNS}, 0 AS relevance
+             FROM developer d
+             WHERE d.mobile LIKE %s)
+            ORDER BY relevance DESC, developer_name
+        """, (phrase, phrase, f"%{search_term}%", f"%{search_term}%", f"%{search_term}%", f"{search_term}%"))
+        # An employee hit by both legs comes back twice; keep the ranked MATCH row
+        rows, seen = [], set()
+        for row in cursor.fetchall():
+            del row['relevance']
+            if row['id'] not in seen:
+                seen.add(row['id'])
+                rows.append(row)
+        return rows
+    except mysql.connector.Error as e:
+        if e.errno != errorcode.ER_FT_MATCHING_KEY_NOT_FOUND:
+            raise
+        print("FULLTEXT index ft_all missing on developer; employee search will use LIKE scans")
+        _SEARCH_FULLTEXT_AVAILABLE = False
+        return []
+
+# The active roster changes rarely; fuzzy lookups reuse it for a minute instead of re-reading the table
+ROSTER_CACHE_TTL = 60
+ROSTER_LIMIT = 2000
+_ROSTER_CACHE = TTLCache(maxsize=1, ttl=ROSTER_CACHE_TTL)
+_ROSTER_CACHE_LOCK = threading.Lock()
+
+def get_active_roster(cursor) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str, str]]]:
+    """Active employees plus their NameMatcher.index_names entries, built once per refresh."""
+    # Refreshing under the lock means concurrent misses share one roster query
+    with _ROSTER_CACHE_LOCK:
+        roster = _ROSTER_CACHE.get('active')
+        if roster is None:
+            cursor.execute(f"""
+                SELECT {EMPLOYEE_BRIEF_COLUMNS}
+                FROM developer d
+                WHERE d.status = 1
+                ORDER BY d.id
+                LIMIT %s
+            """, (ROSTER_LIMIT,))
+            rows = cursor.fetchall()
+            if len(rows) >= ROSTER_LIMIT:
+                print(f"Warning: active roster truncated to {ROSTER_LIMIT} rows; fuzzy search may miss employees")
+            roster = _ROSTER_CACHE['active'] = (rows, NameMatcher.index_names(rows))
+        return roster
+
+def fuzzy_search_employees(cursor, search_term: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """Best fuzzy matches among active employees, scored against the cached roster."""
+    roster, name_index = get_active_roster(cursor)
+    matches = NameMatcher.fuzzy_match_employee(search_term, roster, limit=limit, name_index=name_index)
+    # Copies, so the cached roster rows stay untagged
+    return [dict(match['employee'], match_type='fuzzy') for match in matches]
+
+def fetch_employees_brief(search_term: str) -> List[Dict[str, Any]]:
+    """Employees matching a search term, with only the EMPLOYEE_BRIEF_COLUMNS needed for listings."""
+    if not search_term:
+        return []
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        if emp_id:
-            cursor.execute("""
-                SELECT d.id, d.developer_name, d.designation, d.email_id, d.mobile, 
-                       d.status, d.doj, d.emp_number, d.blood_group,
-                       u.username, d.opening_leave_balance, d.is_pf_enabled, d.pf_join_date
-                FROM developer d
-                LEFT JOIN user u ON d.user_id = u.user_id
-                WHERE d.id = %s
-            """, (emp_id,))
-        elif search_term:
-            cursor.execute("""
-                SELECT d.id, d.developer_name, d.designation, d.email_id, d.mobile, 
-                       d.status, d.doj, d.emp_number, d.blood_group,
-                       u.username, d.opening_leave_balance, d.is_pf_enabled, d.pf_join_date
+        rows = search_employees_fulltext(cursor, search_term)
+        if not rows:
+            cursor.execute(f"""
+                SELECT {EMPLOYEE_BRIEF_COLUMNS}
                 FROM developer d
-                LEFT JOIN user u ON d.user_id = u.user_id
                 WHERE d.developer_name LIKE %s OR d.email_id LIKE %s 
                    OR d.mobile LIKE %s OR d.emp_number LIKE %s
                 ORDER BY d.developer_name
             """, (f"%{search_term}%", f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"))
-        else:
-            return []
+            rows = cursor.fetchall()
 
-        rows = cursor.fetchall()
-
-        if search_term and not rows:
-            cursor.execute("""
-                SELECT d.id, d.developer_name, d.designation, d.email_id, d.mobile, 
-                       d.status, d.doj, d.emp_number, d.blood_group,
-                       u.username, d.opening_leave_balance, d.is_pf_enabled, d.pf_join_date
-                FROM developer d
-                LEFT JOIN user u ON d.user_id = u.user_id
-                WHERE d.status = 1
-            """)
-            all_employees = cursor.fetchall()
-            fuzzy_matches = NameMatcher.fuzzy_match_employee(search_term, all_employees)
-            rows = [match['employee'] for match in fuzzy_matches[:5]]
+        if not rows:
+            rows = fuzzy_search_employees(cursor, search_term)
 
         return rows
 
@@ -217,40 +347,85 @@ def fetch_employees_ai(search_term: str = None, emp_id: int = None) -> List[Dict
         cursor.close()
         conn.close()
 
-def get_leave_balance_for_employee(developer_id: int) -> Dict[str, Any]:
+def fetch_employee_full(emp_id: int) -> Optional[Dict[str, Any]]:
+    """Every profile column for one employee, for the detail view."""
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
         cursor.execute("""
-            SELECT opening_leave_balance, doj, status 
-            FROM developer 
-            WHERE id = %s
-        """, (developer_id,))
-        developer_info = cursor.fetchone()
+            SELECT d.id, d.developer_name, d.designation, d.email_id, d.mobile, 
+                   d.status, d.doj, d.emp_number, d.blood_group,
+                   u.username, d.opening_leave_balance, d.is_pf_enabled, d.pf_join_date
+            FROM developer d
+            LEFT JOIN user u ON d.user_id = u.user_id
+            WHERE d.id = %s
+        """, (emp_id,))
+        return cursor.fetchone()
+
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+# Days charged per leave request by type; anything not listed counts as a full day
+_LEAVE_WEIGHT = {
+    'FULL DAY': 1.0,
+    'HALF DAY': 0.5,
+    'COMPENSATION HALF DAY': 0.5,
+    '2 HRS': 0.25,
+    'COMPENSATION 2 HRS': 0.25,
+}
+
+def weighted_leave_days(leave_type: Optional[str], count: Any) -> float:
+    return float(count or 0) * _LEAVE_WEIGHT.get((leave_type or '').upper(), 1.0)
+
+# SQL counterpart of _LEAVE_WEIGHT over a LEFT JOIN-ed leave_requests lr,
+# so the database can sum used leave days directly (no joined row counts as 0)
+LEAVE_DAYS_SQL = """
+    CASE
+        WHEN lr.developer_id IS NULL THEN 0.0
+        WHEN UPPER(lr.leave_type) = 'FULL DAY' THEN 1.0
+        WHEN UPPER(lr.leave_type) IN ('HALF DAY', 'COMPENSATION HALF DAY') THEN 0.5
+        WHEN UPPER(lr.leave_type) IN ('2 HRS', 'COMPENSATION 2 HRS') THEN 0.25
+        ELSE 1.0
+    END
+"""
+
+_LEAVE_BALANCE_SQL = f"""
+    SELECT d.opening_leave_balance, d.doj, d.status,
+           COALESCE(SUM({LEAVE_DAYS_SQL}), 0) AS used_leaves
+    FROM developer d
+    LEFT JOIN leave_requests lr ON lr.developer_id = d.id AND lr.status = 'Approved'
+    WHERE d.id = %s
+    GROUP BY d.id, d.opening_leave_balance, d.doj, d.status
+"""
+
+_LEAVE_BREAKDOWN_SQL = """
+    SELECT leave_type, COUNT(*) as count
+    FROM leave_requests 
+    WHERE developer_id = %s AND status = 'Approved'
+    GROUP BY leave_type
+"""
+
+def get_leave_balance_for_employee(developer_id: int, include_details: bool = False) -> Dict[str, Any]:
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(_LEAVE_BALANCE_SQL, (developer_id,))
+        developer_rows = cursor.fetchall()
         
-        if not developer_info:
+        if not developer_rows:
             return {"error": "Employee not found"}
-        
-        cursor.execute("""
-            SELECT leave_type, COUNT(*) as count
-            FROM leave_requests 
-            WHERE developer_id = %s AND status = 'Approved'
-            GROUP BY leave_type
-        """, (developer_id,))
-        leave_counts = cursor.fetchall()
-        
-        used_leaves = 0.0
-        for leave in leave_counts:
-            lt = (leave.get('leave_type') or '').upper()
-            cnt = float(leave.get('count') or 0)
-            if lt == 'FULL DAY':
-                used_leaves += cnt
-            elif lt in ['HALF DAY', 'COMPENSATION HALF DAY']:
-                used_leaves += cnt * 0.5
-            elif lt in ['2 HRS', 'COMPENSATION 2 HRS']:
-                used_leaves += cnt * 0.25
-            else:
-                used_leaves += cnt
+        developer_info = developer_rows[0]
+        used_leaves = float(developer_info['used_leaves'])
+
+        # The per-type breakdown is only shown by the get_leave_balance tool
+        leave_counts = []
+        if include_details:
+            cursor.execute(_LEAVE_BREAKDOWN_SQL, (developer_id,))
+            leave_counts = cursor.fetchall()
 
         opening_balance = float(developer_info.get('opening_leave_balance') or 0)
         current_balance = opening_balance - used_leaves
@@ -268,6 +443,49 @@ def get_leave_balance_for_employee(developer_id: int) -> Dict[str, Any]:
         cursor.close()
         conn.close()
 
+def get_leave_balances_bulk(developer_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Leave balances for several employees in one round trip, keyed by developer id; {} on error."""
+    if not developer_ids:
+        return {}
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        placeholders = ",".join(["%s"] * len(developer_ids))
+        cursor.execute(f"""
+            SELECT d.id AS developer_id, d.opening_leave_balance,
+                   lr.leave_type, COUNT(lr.developer_id) as count
+            FROM developer d
+            LEFT JOIN leave_requests lr ON lr.developer_id = d.id AND lr.status = 'Approved'
+            WHERE d.id IN ({placeholders})
+            GROUP BY d.id, d.opening_leave_balance, lr.leave_type
+        """, tuple(developer_ids))
+
+        balances: Dict[int, Dict[str, Any]] = {}
+        for row in cursor.fetchall():
+            balance = balances.get(row['developer_id'])
+            if balance is None:
+                opening_balance = float(row.get('opening_leave_balance') or 0)
+                balance = balances[row['developer_id']] = {
+                    "opening_balance": opening_balance,
+                    "used_leaves": 0.0,
+                    "current_balance": opening_balance,
+                    "leave_details": []
+                }
+            # Employees without approved leave come back as a single NULL-type row with count 0
+            if row['count']:
+                days = weighted_leave_days(row.get('leave_type'), row['count'])
+                balance["used_leaves"] += days
+                balance["current_balance"] -= days
+                balance["leave_details"].append({'leave_type': row['leave_type'], 'count': row['count']})
+        return balances
+
+    except Exception as e:
+        print(f"Error fetching leave balances: {e}")
+        return {}
+    finally:
+        cursor.close()
+        conn.close()
+
 def get_employee_work_report(developer_id: int, days: int = 30) -> List[Dict[str, Any]]:
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
@@ -283,9 +501,7 @@ def get_employee_work_report(developer_id: int, days: int = 30) -> List[Dict[str
             ORDER BY wr.date DESC
             LIMIT 100
         """, (developer_id, days))
-        
         return cursor.fetchall()
-        
     except Exception as e:
         print(f"Error fetching work report: {e}")
         return []
@@ -305,9 +521,7 @@ def get_employee_leave_requests(developer_id: int, limit: int = 100) -> List[Dic
             ORDER BY date_of_leave DESC
             LIMIT %s
         """, (developer_id, limit))
-        
         return cursor.fetchall()
-        
     except Exception as e:
         print(f"Error fetching leave requests: {e}")
         return []
@@ -318,29 +532,56 @@ def get_employee_leave_requests(developer_id: int, limit: int = 100) -> List[Dic
 # -------------------------------
 # Employee Resolution
 # -------------------------------
+def format_employee_option(i: int, emp: Dict[str, Any]) -> str:
+    fields = [f"{i}. 👤 {emp.get('developer_name','Unknown')}"]
+    if emp.get('designation'):
+        fields.append(f"💼 {emp.get('designation')}")
+    if emp.get('email_id'):
+        fields.append(f"📧 {emp.get('email_id')}")
+    if emp.get('emp_number'):
+        fields.append(f"🆔 {emp.get('emp_number')}")
+    if emp.get('mobile'):
+        fields.append(f"📞 {emp.get('mobile')}")
+    status = "Active" if emp.get('status') == 1 else "Inactive"
+    fields.append(f"🔰 {status}")
+    return " | ".join(fields)
+
 def format_employee_options(employees: List[Dict[str, Any]]) -> str:
-    options = []
-    for i, emp in enumerate(employees, 1):
-        option = f"{i}. 👤 {emp.get('developer_name','Unknown')}"
-        if emp.get('designation'):
-            option += f" | 💼 {emp.get('designation')}"
-        if emp.get('email_id'):
-            option += f" | 📧 {emp.get('email_id')}"
-        if emp.get('emp_number'):
-            option += f" | 🆔 {emp.get('emp_number')}"
-        if emp.get('mobile'):
-            option += f" | 📞 {emp.get('mobile')}"
-        status = "Active" if emp.get('status') == 1 else "Inactive"
-        option += f" | 🔰 {status}"
-        options.append(option)
-    return "\n".join(options)
+    return "\n".join(format_employee_option(i, emp) for i, emp in enumerate(employees, 1))
+
+# Resolved lookups are reused for a minute so follow-up questions skip the database
+_RESOLVE_CACHE = TTLCache(maxsize=512, ttl=60)
+_RESOLVE_CACHE_LOCK = threading.Lock()
 
 def resolve_employee_ai(search_name: str, additional_context: str = None) -> Dict[str, Any]:
-    employees = fetch_employees_ai(search_term=search_name)
+    cache_key = ((search_name or '').lower().strip(), (additional_context or '').lower().strip())
+    with _RESOLVE_CACHE_LOCK:
+        cached = _RESOLVE_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    resolution = _resolve_employee(search_name, additional_context)
+
+    # not_found / ambiguous are not cached so newly added employees show up immediately
+    if resolution['status'] == 'resolved':
+        with _RESOLVE_CACHE_LOCK:
+            _RESOLVE_CACHE[cache_key] = resolution
+    return resolution
+
+def _resolve_employee(search_name: str, additional_context: str = None) -> Dict[str, Any]:
+    employees = fetch_employees_brief(search_name)
 
     if not employees:
         return {'status': 'not_found', 'message': f"No employees found matching '{search_name}'"}
 
+    # Fuzzy matches are only suggestions: always ask, even for a single one
+    if employees[0].get('match_type') == 'fuzzy':
+        return {
+            'status': 'ambiguous',
+            'employees': employees,
+            'message': f"No exact match for '{search_name}'. Did you mean:"
+        }
+
     if len(employees) == 1:
         return {'status': 'resolved', 'employee': employees[0]}
 
@@ -370,55 +611,64 @@ def resolve_employee_ai(search_name: str, additional_context: str = None) -> Dic
 # -------------------------------
 # MCP Tools
 # -------------------------------
+AMBIGUOUS_EMPLOYEE_TIP = "💡 Tip: You can specify by:\n- Designation (e.g., 'Developer')\n- Email\n- Employee number\n- Or say the number (e.g., '1')"
+
 @mcp.tool()
-def get_employee_details(name: str, additional_context: Optional[str] = None) -> str:
+async def get_employee_details(name: str, additional_context: Optional[str] = None) -> str:
     """Get comprehensive details for an employee including personal info, leave balance, and recent activity"""
-    resolution = resolve_employee_ai(name, additional_context)
+    resolution = await asyncio.to_thread(resolve_employee_ai, name, additional_context)
     
     if resolution['status'] == 'not_found':
         return f"❌ No employee found matching '{name}'."
     
     if resolution['status'] == 'ambiguous':
         options_text = format_employee_options(resolution['employees'])
-        return f"🔍 {resolution['message']}\n\n{options_text}\n\n💡 Tip: You can specify by:\n- Designation (e.g., 'Developer')\n- Email\n- Employee number\n- Or say the number (e.g., '1')"
+        return f"🔍 {resolution['message']}\n\n{options_text}\n\n{AMBIGUOUS_EMPLOYEE_TIP}"
 
     emp = resolution['employee']
     
-    leave_balance = get_leave_balance_for_employee(emp['id'])
-    work_reports = get_employee_work_report(emp['id'], days=7)
-    leave_requests = get_employee_leave_requests(emp['id'], limit=10)
+    # Independent queries on separate pooled connections; latency is the slowest, not the sum
+    full_emp, leave_balance, work_reports, leave_requests = await asyncio.gather(
+        asyncio.to_thread(fetch_employee_full, emp['id']),
+        asyncio.to_thread(get_leave_balance_for_employee, emp['id']),
+        asyncio.to_thread(get_employee_work_report, emp['id'], 7),
+        asyncio.to_thread(get_employee_leave_requests, emp['id'], 10),
+    )
+    emp = full_emp or emp
     
-    response = f"✅ **Employee Details**\n\n"
-    response += f"👤 **{emp['developer_name']}**\n"
-    response += f"🆔 Employee ID: {emp['id']} | Employee #: {emp.get('emp_number', 'N/A')}\n"
-    response += f"💼 Designation: {emp.get('designation', 'N/A')}\n"
-    response += f"📧 Email: {emp.get('email_id', 'N/A')}\n"
-    response += f"📞 Mobile: {emp.get('mobile', 'N/A')}\n"
-    response += f"🩸 Blood Group: {emp.get('blood_group', 'N/A')}\n"
-    response += f"📅 Date of Joining: {emp.get('doj', 'N/A')}\n"
-    response += f"🔰 Status: {'Active' if emp.get('status') == 1 else 'Inactive'}\n\n"
+    parts = [
+        "✅ **Employee Details**\n\n",
+        f"👤 **{emp['developer_name']}**\n",
+        f"🆔 Employee ID: {emp['id']} | Employee #: {emp.get('emp_number', 'N/A')}\n",
+        f"💼 Designation: {emp.get('designation', 'N/A')}\n",
+        f"📧 Email: {emp.get('email_id', 'N/A')}\n",
+        f"📞 Mobile: {emp.get('mobile', 'N/A')}\n",
+        f"🩸 Blood Group: {emp.get('blood_group', 'N/A')}\n",
+        f"📅 Date of Joining: {emp.get('doj', 'N/A')}\n",
+        f"🔰 Status: {'Active' if emp.get('status') == 1 else 'Inactive'}\n\n",
+    ]
     
     if 'error' not in leave_balance:
-        response += f"📊 **Leave Balance:** {leave_balance['current_balance']:.1f} days\n"
-        response += f"   - Opening Balance: {leave_balance['opening_balance']}\n"
-        response += f"   - Leaves Used: {leave_balance['used_leaves']:.1f} days\n\n"
+        parts.append(f"📊 **Leave Balance:** {leave_balance['current_balance']:.1f} days\n")
+        parts.append(f"   - Opening Balance: {leave_balance['opening_balance']}\n")
+        parts.append(f"   - Leaves Used: {leave_balance['used_leaves']:.1f} days\n\n")
     else:
-        response += f"📊 Leave Balance: Data not available\n\n"
+        parts.append("📊 Leave Balance: Data not available\n\n")
     
     if work_reports:
-        response += f"📋 **Recent Work (Last 7 days):**\n"
+        parts.append("📋 **Recent Work (Last 7 days):**\n")
         for report in work_reports[:3]:
             hours = (report['total_time'] or 0) / 3600 if report.get('total_time') else 0
-            response += f"   - {report['date']}: {report['task'][:60]}... ({hours:.1f}h)\n"
-        response += "\n"
+            parts.append(f"   - {report['date']}: {report['task'][:60]}... ({hours:.1f}h)\n")
+        parts.append("\n")
     
     if leave_requests:
-        response += f"🏖️  **Recent Leave Requests:**\n"
+        parts.append("🏖️  **Recent Leave Requests:**\n")
         for leave in leave_requests[:3]:
             status_icon = "✅" if leave['status'] == 'Approved' else "⏳" if leave['status'] in ['Requested', 'Pending'] else "❌"
-            response += f"   - {leave['date_of_leave']}: {leave['leave_type']} {status_icon}\n"
+            parts.append(f"   - {leave['date_of_leave']}: {leave['leave_type']} {status_icon}\n")
     
-    return response
+    return "".join(parts)
 
 @mcp.tool()
 def get_leave_balance(name: str, additional_context: Optional[str] = None) -> str:
@@ -433,98 +683,104 @@ def get_leave_balance(name: str, additional_context: Optional[str] = None) -> st
         return f"🔍 {resolution['message']}\n\n{options_text}"
 
     emp = resolution['employee']
-    leave_balance = get_leave_balance_for_employee(emp['id'])
+    leave_balance = get_leave_balance_for_employee(emp['id'], include_details=True)
     
     if 'error' in leave_balance:
         return f"❌ Error retrieving leave balance for {emp['developer_name']}: {leave_balance['error']}"
     
-    response = f"📊 **Leave Balance for {emp['developer_name']}**\n\n"
-    response += f"💼 Designation: {emp.get('designation', 'N/A')}\n"
-    response += f"📧 Email: {emp.get('email_id', 'N/A')}\n\n"
-    
-    response += f"💰 **Current Balance:** {leave_balance['current_balance']:.1f} days\n"
-    response += f"📥 Opening Balance: {leave_balance['opening_balance']} days\n"
-    response += f"📤 Leaves Used: {leave_balance['used_leaves']:.1f} days\n\n"
+    parts = [
+        f"📊 **Leave Balance for {emp['developer_name']}**\n\n",
+        f"💼 Designation: {emp.get('designation', 'N/A')}\n",
+        f"📧 Email: {emp.get('email_id', 'N/A')}\n\n",
+        f"💰 **Current Balance:** {leave_balance['current_balance']:.1f} days\n",
+        f"📥 Opening Balance: {leave_balance['opening_balance']} days\n",
+        f"📤 Leaves Used: {leave_balance['used_leaves']:.1f} days\n\n",
+    ]
     
     if leave_balance['leave_details']:
-        response += f"📋 **Breakdown of Used Leaves:**\n"
+        parts.append("📋 **Breakdown of Used Leaves:**\n")
         for leave in leave_balance['leave_details']:
-            lt = (leave.get('leave_type') or '').upper()
-            days_equiv = 1.0 if lt == 'FULL DAY' else 0.5 if lt in ['HALF DAY','COMPENSATION HALF DAY'] else 0.25 if lt in ['2 HRS','COMPENSATION 2 HRS'] else 1.0
-            total_days = float(leave.get('count') or 0) * days_equiv
-            response += f"   - {leave['leave_type']}: {leave['count']} times ({total_days:.1f} days)\n"
+            total_days = weighted_leave_days(leave.get('leave_type'), leave.get('count'))
+            parts.append(f"   - {leave['leave_type']}: {leave['count']} times ({total_days:.1f} days)\n")
     
-    return response
+    return "".join(parts)
 
 @mcp.tool()
 def search_employees(search_query: str) -> str:
     """Search for employees by name, designation, email, or employee number"""
-    employees = fetch_employees_ai(search_term=search_query)
+    employees = fetch_employees_brief(search_query)
     
     if not employees:
         return f"❌ No employees found matching '{search_query}'"
     
-    response = f"🔍 **Search Results for '{search_query}':**\n\n"
+    leave_balances = get_leave_balances_bulk([emp['id'] for emp in employees])
+    parts = [f"🔍 **Search Results for '{search_query}':**\n\n"]
     
     for i, emp in enumerate(employees, 1):
-        response += f"{i}. **{emp['developer_name']}**\n"
-        response += f"   💼 {emp.get('designation', 'N/A')}\n"
-        response += f"   📧 {emp.get('email_id', 'N/A')}\n"
-        response += f"   📞 {emp.get('mobile', 'N/A')}\n"
-        response += f"   🆔 {emp.get('emp_number', 'N/A')}\n"
-        response += f"   🔰 {'Active' if emp.get('status') == 1 else 'Inactive'}\n"
+        parts.append(f"{i}. **{emp['developer_name']}**\n")
+        parts.append(f"   💼 {emp.get('designation', 'N/A')}\n")
+        parts.append(f"   📧 {emp.get('email_id', 'N/A')}\n")
+        parts.append(f"   📞 {emp.get('mobile', 'N/A')}\n")
+        parts.append(f"   🆔 {emp.get('emp_number', 'N/A')}\n")
+        parts.append(f"   🔰 {'Active' if emp.get('status') == 1 else 'Inactive'}\n")
         
-        try:
-            leave_balance = get_leave_balance_for_employee(emp['id'])
-            if 'error' not in leave_balance:
-                response += f"   📊 Leave Balance: {leave_balance['current_balance']:.1f} days\n"
-        except Exception:
-            pass
+        if emp['id'] in leave_balances:
+            parts.append(f"   📊 Leave Balance: {leave_balances[emp['id']]['current_balance']:.1f} days\n")
         
-        response += "\n"
+        parts.append("\n")
     
-    return response
+    return "".join(parts)
 
 # Add more tools as needed...
 
 # -------------------------------
 # Routes for Smithery Discovery
 # -------------------------------
+def _json_body(content: Dict[str, Any]) -> bytes:
+    # Same serialization as JSONResponse.render, done once at import
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+# Static route bodies are serialized once; handlers only wrap the cached bytes
+_MCP_CONFIG_BODY = _json_body({
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "$id": "/.well-known/mcp-config",
+    "title": "MCP Session Configuration",
+    "description": "Schema for the /mcp endpoint configuration",
+    "x-query-style": "dot+bracket"
+})
+_MCP_ENDPOINT_BODY = _json_body({"status": "MCP server is running", "authentication": "API key required"})
+_HEALTH_BODY = b"OK"
+_ROOT_BODY = _json_body({
+    "message": "Secure Leave Manager + HR MCP Server",
+    "status": "running",
+    "version": "1.0.0",
+    "authentication": "API key required for MCP endpoints"
+})
+
 @mcp.custom_route("/.well-known/mcp-config", methods=["GET"])
-async def mcp_config(request: Request) -> JSONResponse:
+async def mcp_config(request: Request) -> Response:
     """MCP configuration discovery endpoint for Smithery"""
-    return JSONResponse({
-        "$schema": "https://json-schema.org/draft/2020-12/schema",
-        "$id": "/.well-known/mcp-config",
-        "title": "MCP Session Configuration",
-        "description": "Schema for the /mcp endpoint configuration",
-        "x-query-style": "dot+bracket"
-    })
+    return Response(_MCP_CONFIG_BODY, media_type="application/json")
 
 @mcp.custom_route("/mcp", methods=["POST"])
 async def mcp_endpoint(request: Request):
     """MCP protocol endpoint"""
-    return JSONResponse({"status": "MCP server is running", "authentication": "API key required"})
+    return Response(_MCP_ENDPOINT_BODY, media_type="application/json")
 
 @mcp.custom_route("/health", methods=["GET"])
 async def health_check(request: Request) -> PlainTextResponse:
-    return PlainTextResponse("OK")
+    return PlainTextResponse(_HEALTH_BODY)
 
 @mcp.custom_route("/", methods=["GET"])
-async def root(request: Request) -> JSONResponse:
-    return JSONResponse({
-        "message": "Secure Leave Manager + HR MCP Server",
-        "status": "running",
-        "version": "1.0.0",
-        "authentication": "API key required for MCP endpoints"
-    })
+async def root(request: Request) -> Response:
+    return Response(_ROOT_BODY, media_type="application/json")
 
 # -------------------------------
 # Run MCP server
 # -------------------------------
 if __name__ == "__main__":
-    if Levenshtein is None:
-        print("Warning: python-levenshtein not installed. Fuzzy quality will be slightly lower.")
+    if fuzz is None:
+        print("Warning: rapidfuzz not installed. Fuzzy matching will be slower and slightly lower quality.")
 
     transport = os.environ.get("MCP_TRANSPORT", "streamable-http")
     host = os.environ.get("MCP_HOST", "0.0.0.0")